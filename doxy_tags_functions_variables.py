@@ -1,11 +1,34 @@
+import mmap
 import os
 import re
-from typing import List, Tuple
+import shutil
+import string
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, as_completed, wait
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from enum import Enum, auto
 
 # Define the extensions of the source code files you want to process
 SUPPORTED_EXTENSIONS: Tuple[str, ...] = ('.cpp', '.hpp', '.h', '.c')  # Add more as needed
 
+# Encoding of the source code files, undecodable bytes are carried through unchanged
+SOURCE_ENCODING: str = 'utf-8'
+
+# Size of the buffer used to write the modified files where os.writev is not available (e.g. on Windows), so the
+# slices of the content are still written in few system calls
+WRITE_BUFFER_SIZE: int = 1 << 20
+
+# Maximum number of segments written by a single os.writev call, IOV_MAX on Linux and macOS
+MAX_WRITE_SEGMENTS: int = 1024
+
+# Number of Doxygen comments cached by each comment generator, as the same names and declarations repeat across files
+COMMENT_CACHE_SIZE: int = 4096
+
+# Number of files handed to the worker processes and not yet processed, before the directory walk waits for them
+MAX_PENDING_FILES: int = 1024
+
 class VariableType(Enum):
     CONSTANT = auto()
     POINTER_OR_REFERENCE = auto()
@@ -52,6 +75,57 @@ CONSTANT_TEMPLATE: str = """
  */
 """
 
+def parse_template(template: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """
+    Splits a template once into its literal texts and the names of the fields following them.
+
+    :param template: The template, in the str.format syntax without conversions or format specifications.
+    :return: The literal texts, each with the name of the field that follows it or None after the last one.
+    """
+    return tuple((literal_text, field_name) for literal_text, field_name, _, _ in string.Formatter().parse(template))
+
+def fill_template(template_parts: Tuple[Tuple[str, Optional[str]], ...], fields: Dict[str, str]) -> str:
+    """
+    Fills a parsed template with the values of its fields, without parsing the template again.
+
+    :param template_parts: The template, as returned by parse_template.
+    :param fields: The value of each field of the template.
+    :return: The filled template.
+    """
+    return ''.join([
+        literal_text if field_name is None else literal_text + fields[field_name]
+        for literal_text, field_name in template_parts
+    ])
+
+# Parse the templates once at import, str.format would parse them again for every comment
+FUNCTION_TEMPLATE_PARTS: Tuple[Tuple[str, Optional[str]], ...] = parse_template(FUNCTION_TEMPLATE)
+VARIABLE_TEMPLATE_PARTS: Tuple[Tuple[str, Optional[str]], ...] = parse_template(VARIABLE_TEMPLATE)
+STRUCT_TEMPLATE_PARTS: Tuple[Tuple[str, Optional[str]], ...] = parse_template(STRUCT_TEMPLATE)
+CONSTANT_TEMPLATE_PARTS: Tuple[Tuple[str, Optional[str]], ...] = parse_template(CONSTANT_TEMPLATE)
+
+# Define the pattern used to find the declarations, compiled once per process.
+# Functions, variables and structs are looked up together at each line start, in a single scan of the content. Each
+# kind sits in its own lookahead, so a declaration of one kind never hides an overlapping declaration of another kind.
+# The guarding lookaheads reject a line unless its declaration characters run up to a '(' (or '=' / ';' for variables),
+# which is cheap to check and avoids backtracking through every way of splitting the type and the name.
+DECLARATION_PATTERN: re.Pattern = re.compile(
+    r'^(?=\s*\w)'
+    r'(?:(?=(?P<function>(?=[\w\s\*&:<>,]*\()\s*(?P<return_type>\w[\w\s\*&:<>,]*)\s+(?P<function_name>\w+)\s*\((?P<params>[^)]*)\)\s*(?:const)?\s*{?))|)'
+    r'(?:(?=(?P<variable>(?=[\w\s\*&:<>,]*[=;])\s*(?P<declaration_type>\w[\w\s\*&:<>,]*)\s+(?P<variable_name>\w+)\s*(?:=\s*[^;]+)?\s*;))|)'
+    r'(?:(?=(?P<struct>\s*struct\s+(?P<struct_name>\w+)))|)',
+    re.MULTILINE
+)
+DECLARATION_KINDS: Tuple[str, ...] = ('function', 'variable', 'struct')
+# Matches the first character that cannot be part of a declaration before its '(', '=' or ';'
+DECLARATION_TERMINATOR_PATTERN: re.Pattern = re.compile(r'[^\w\s\*&:<>,]')
+# Matches the end of each line
+LINE_END_PATTERN: re.Pattern = re.compile(r'\n')
+# Matches the delimiters of the block and line comments, and the string and char literals that may contain them
+COMMENT_DELIMITER_PATTERN: re.Pattern = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|/\*|\*/|//')
+ARRAY_PATTERN: re.Pattern = re.compile(r'.*\[\s*\d*\s*\]')
+# Matches the last word of each comma separated parameter, which is its name
+PARAMETER_NAME_PATTERN: re.Pattern = re.compile(r'([^\s,]+)\s*(?:,|$)')
+
 def detect_variable_type(declaration: str) -> VariableType:
     """
     Detects the type of a variable based on its declaration.
@@ -63,7 +137,7 @@ def detect_variable_type(declaration: str) -> VariableType:
         return VariableType.CONSTANT
     if '*' in declaration or '&' in declaration:
         return VariableType.POINTER_OR_REFERENCE
-    if re.match(r'.*\[\s*\d*\s*\]', declaration):
+    if ARRAY_PATTERN.match(declaration):
         return VariableType.ARRAY
     return VariableType.VARIABLE  # Default case
 
@@ -76,19 +150,33 @@ def generate_function_comment(return_type: str, function_name: str, params: str)
     :param params: The parameters of the function.
     :return: A string containing the Doxygen comment.
     """
-    formatted_params = ', '.join([param.split()[-1] for param in params.split(',') if param])
+    # Only whether the function returns void changes the comment, which keeps the cache key small
+    return format_function_comment(return_type.strip() == "void", function_name, params)
+
+@lru_cache(maxsize=COMMENT_CACHE_SIZE)
+def format_function_comment(returns_void: bool, function_name: str, params: str) -> str:
+    """
+    Formats the Doxygen comment of a function.
+
+    :param returns_void: Whether the return type of the function is void.
+    :param function_name: The name of the function.
+    :param params: The parameters of the function.
+    :return: A string containing the Doxygen comment.
+    """
+    formatted_params = ', '.join(PARAMETER_NAME_PATTERN.findall(params))
 
     brief_description = f"Brief description of the function {function_name}."
     detailed_description = f"Detailed description of the function {function_name}."
-    return_description = f"Return value of {function_name}." if return_type.strip() != "void" else "No return value."
+    return_description = "No return value." if returns_void else f"Return value of {function_name}."
 
-    return FUNCTION_TEMPLATE.format(
-        brief_description=brief_description,
-        detailed_description=detailed_description,
-        params=formatted_params,
-        return_description=return_description
-    )
+    return fill_template(FUNCTION_TEMPLATE_PARTS, {
+        'brief_description': brief_description,
+        'detailed_description': detailed_description,
+        'params': formatted_params,
+        'return_description': return_description
+    })
 
+@lru_cache(maxsize=COMMENT_CACHE_SIZE)
 def generate_variable_comment(var_type: VariableType, variable_name: str) -> str:
     """
     Generates a Doxygen comment for a variable based on its type and name.
@@ -98,16 +186,17 @@ def generate_variable_comment(var_type: VariableType, variable_name: str) -> str
     :return: A string containing the Doxygen comment.
     """
     if var_type == VariableType.CONSTANT:
-        return CONSTANT_TEMPLATE.format(constant_name=variable_name)
+        return fill_template(CONSTANT_TEMPLATE_PARTS, {'constant_name': variable_name})
     
     brief_description = f"Brief description of the {var_type.name.lower()} {variable_name}."
     detailed_description = f"Detailed description of the {var_type.name.lower()} {variable_name}."
     
-    return VARIABLE_TEMPLATE.format(
-        brief_description=brief_description,
-        detailed_description=detailed_description
-    )
+    return fill_template(VARIABLE_TEMPLATE_PARTS, {
+        'brief_description': brief_description,
+        'detailed_description': detailed_description
+    })
 
+@lru_cache(maxsize=COMMENT_CACHE_SIZE)
 def generate_struct_comment(struct_name: str) -> str:
     """
     Generates a Doxygen comment for a struct based on its name.
@@ -115,35 +204,67 @@ def generate_struct_comment(struct_name: str) -> str:
     :param struct_name: The name of the struct.
     :return: A string containing the Doxygen comment.
     """
-    return STRUCT_TEMPLATE.format(struct_type="struct", struct_name=struct_name)
+    return fill_template(STRUCT_TEMPLATE_PARTS, {'struct_type': "struct", 'struct_name': struct_name})
 
-def is_preceded_by_comment(content: str, start_index: int) -> bool:
+def find_line_starts(text: str) -> List[int]:
     """
-    Checks if the code at the given index is preceded by a comment.
+    Finds the position of each line of the text, without copying the lines.
 
-    :param content: The content of the file.
-    :param start_index: The index at which to check for a preceding comment.
-    :return: True if the code is preceded by a comment, otherwise False.
+    :param text: The decoded content of the file.
+    :return: The position of each line, followed by the length of the text.
     """
-    lines_before = content[:start_index].strip().splitlines()
-    if not lines_before:
-        return False
-    
-    previous_line = lines_before[-1].strip()
+    line_starts: List[int] = [0]
+    line_starts.extend(match.end() for match in LINE_END_PATTERN.finditer(text))
+    # The last line has no line ending
+    if line_starts[-1] != len(text):
+        line_starts.append(len(text))
 
-    if previous_line.startswith('//'):
-        return True
-    
-    # Check for multi-line comment
-    if '*/' in previous_line:
-        # Search for '/*' in preceding lines
-        for line in reversed(lines_before):
-            if '/*' in line:
-                return True
-            if '*/' in line:
-                break
+    return line_starts
+
+def find_commented_line_starts(text: str, line_starts: List[int]) -> Set[int]:
+    """
+    Finds, in a single pass over the lines, the line starts whose code is preceded by a comment.
 
-    return False
+    :param text: The decoded content of the file.
+    :param line_starts: The position of each line, followed by the length of the text.
+    :return: The positions of the line starts preceded by a comment.
+    """
+    commented_line_starts: Set[int] = set()
+    is_comment = False
+    # Whether the end of the last non-blank line is inside a block comment
+    is_block_comment_open = False
+
+    for line_start, next_line_start in zip(line_starts, islice(line_starts, 1, None)):
+        previous_line = text[line_start:next_line_start].strip()
+        # Blank lines keep the result of the last non-blank line
+        if previous_line:
+            # A line is a comment if it starts inside a block comment or with a line comment, or opens a block comment
+            is_comment = is_block_comment_open or previous_line.startswith('//')
+            position = 0
+            while True:
+                if is_block_comment_open:
+                    # Only the end of the block comment counts inside it, quotes included
+                    block_comment_end = previous_line.find('*/', position)
+                    if block_comment_end < 0:
+                        break
+                    is_block_comment_open = False
+                    position = block_comment_end + 2
+                    continue
+
+                delimiter = COMMENT_DELIMITER_PATTERN.search(previous_line, position)
+                # The rest of a line comment does not count
+                if not delimiter or delimiter[0] == '//':
+                    break
+                position = delimiter.end()
+                # String and char literals are skipped, so the delimiters they contain do not count
+                if delimiter[0] == '/*':
+                    is_comment = True
+                    is_block_comment_open = True
+
+        if is_comment:
+            commented_line_starts.add(next_line_start)
+
+    return commented_line_starts
 
 def add_doxygen_to_file(file_path: str) -> None:
     """
@@ -151,95 +272,264 @@ def add_doxygen_to_file(file_path: str) -> None:
 
     :param file_path: Path of the source code file to be modified.
     """    
-    with open(file_path, 'r') as file:
-        content: str = file.read()
-
-    content = add_doxygen_to_functions(content)
-    content = add_doxygen_to_variables(content)
-    content = add_doxygen_to_structs(content)
-
-    with open(file_path, 'w') as file:
-        file.write(content)
-
-def add_doxygen_to_functions(content: str) -> str:
+    # Replace the target of a symbolic link rather than the link itself
+    file_path = os.path.realpath(file_path)
+    temporary_file_path: Optional[str] = None
+    try:
+        with open(file_path, 'rb') as file:
+            # An empty file cannot be mapped, and has nothing to document anyway
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+
+            # The mapping is decoded for the scan, and its slices are then written between the comments into a temporary
+            # file. That file only replaces the original once complete, so the original is never left half written. The
+            # view must be released, and the slices taken from it dropped, before the mapping can be closed.
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                insertions: List[Tuple[int, bytes]] = add_doxygen_to_declarations(content)
+                # Leave the file untouched when every declaration is already commented, e.g. when it was processed
+                # before
+                if not insertions:
+                    return
+
+                with memoryview(content) as content_view:
+                    temporary_file_path = write_temporary_file(
+                        os.path.dirname(file_path), iter_output_segments(content_view, insertions)
+                    )
+
+        # Only replace the file once it is closed and no longer mapped, which Windows requires. The temporary file is
+        # only accessible by its owner, keep the permissions of the original file.
+        shutil.copymode(file_path, temporary_file_path)
+        os.replace(temporary_file_path, file_path)
+    except BaseException:
+        if temporary_file_path is not None:
+            os.remove(temporary_file_path)
+        raise
+
+def iter_output_segments(content_view: memoryview, insertions: List[Tuple[int, bytes]]) -> Iterator[memoryview]:
     """
-    Adds Doxygen comments to functions in the content.
+    Yields the slices of the content interleaved with the Doxygen comments inserted between them.
 
-    :param content: The content of the file.
-    :return: The content with Doxygen comments added for functions.
+    :param content_view: A view of the mapped content of the file, sliced without copying.
+    :param insertions: The positions and encoded Doxygen comments to insert, in ascending order of position.
+    :return: An iterator over the segments of the new content.
     """
-    function_pattern = re.compile(r'^\s*(\w[\w\s\*&:<>,]*)\s+(\w+)\s*\(([^)]*)\)\s*(const)?\s*{?', re.MULTILINE)
-    function_matches: List[re.Match] = list(function_pattern.finditer(content))
-
-    for match in reversed(function_matches):
-        return_type, function_name, params, _ = match.groups()
-
-        # Skip adding comment if function is already preceded by a comment
-        if is_preceded_by_comment(content, match.start()):
-            continue
-
-        doxygen_comment = generate_function_comment(return_type, function_name, params)
-        content = content[:match.start()] + doxygen_comment + content[match.start():]
-
-    return content
-
-def add_doxygen_to_variables(content: str) -> str:
+    previous = 0
+    for position, doxygen_comment in insertions:
+        yield content_view[previous:position]
+        yield memoryview(doxygen_comment)
+        previous = position
+    yield content_view[previous:]
+
+def write_segments(file_descriptor: int, segments: Iterable[memoryview]) -> None:
     """
-    Adds Doxygen comments to variables in the content.
+    Writes the segments to the file with scatter-gather os.writev calls, so they are never concatenated in memory.
 
-    :param content: The content of the file.
-    :return: The content with Doxygen comments added for variables.
+    :param file_descriptor: The file descriptor of the file, opened without buffering.
+    :param segments: The segments to be written, in order.
+    """
+    batch: List[memoryview] = []
+    try:
+        for segment in segments:
+            if segment:
+                batch.append(segment)
+            if len(batch) == MAX_WRITE_SEGMENTS:
+                write_segments_batch(file_descriptor, batch)
+                batch.clear()
+        write_segments_batch(file_descriptor, batch)
+    finally:
+        # Drop the slices of the mapped content even when the write fails, as the traceback keeps the locals alive
+        # and the mapping could not be closed
+        batch.clear()
+        segment = None
+
+def write_segments_batch(file_descriptor: int, batch: List[memoryview]) -> None:
     """
-    variable_pattern = re.compile(r'^\s*(\w[\w\s\*&:<>,]*)\s+(\w+)\s*(=\s*[^;]+)?\s*;', re.MULTILINE)
-    variable_matches: List[re.Match] = list(variable_pattern.finditer(content))
+    Writes a batch of non-empty segments to the file, writing again what a partial write left out.
 
-    for match in reversed(variable_matches):
-        declaration_type, variable_name, _ = match.groups()
+    :param file_descriptor: The file descriptor of the file, opened without buffering.
+    :param batch: At most MAX_WRITE_SEGMENTS non-empty segments, in order.
+    """
+    while batch:
+        written = os.writev(file_descriptor, batch)
+        # Skip the segments written in full, and the written part of the first one that is not
+        written_segments = 0
+        while written_segments < len(batch) and written >= batch[written_segments].nbytes:
+            written -= batch[written_segments].nbytes
+            written_segments += 1
+        # Update the batch in place, so the caller can still drop its slices if a later write fails
+        del batch[:written_segments]
+        if batch:
+            batch[0] = batch[0][written:]
+
+def write_temporary_file(directory: str, segments: Iterable[memoryview]) -> str:
+    """
+    Writes the segments to a new temporary file in the directory.
 
-        # Skip adding comment if variable is already preceded by a comment
-        if is_preceded_by_comment(content, match.start()):
-            continue
+    :param directory: Directory of the file to be replaced, so the temporary file can be moved over it.
+    :param segments: The segments of the new content of the file, in order.
+    :return: Path of the temporary file.
+    """
+    has_writev = hasattr(os, 'writev')
+    # os.writev bypasses the buffer of the file object, so the file is left unbuffered when it is used
+    temporary_file = tempfile.NamedTemporaryFile(
+        dir=directory, delete=False, buffering=0 if has_writev else WRITE_BUFFER_SIZE
+    )
+    try:
+        with temporary_file:
+            if has_writev:
+                write_segments(temporary_file.fileno(), segments)
+            else:
+                temporary_file.writelines(segments)
+    except BaseException:
+        os.remove(temporary_file.name)
+        raise
+
+    return temporary_file.name
+
+def find_declaration_candidates(text: str, line_starts: List[int]) -> List[int]:
+    """
+    Finds the line starts where a declaration can begin, so the declaration pattern only runs on those lines.
 
-        var_type = detect_variable_type(declaration_type)
-        doxygen_comment = generate_variable_comment(var_type, variable_name)
-        content = content[:match.start()] + doxygen_comment + content[match.start():]
+    Up to its '(', '=' or ';', a function or variable declaration is made only of declaration characters, possibly over
+    several lines. A line is therefore a candidate only if the first other character from its start is one of those,
+    or if it starts with a struct.
 
-    return content
+    :param text: The decoded content of the file.
+    :param line_starts: The position of each line, followed by the length of the text.
+    :return: The candidate line starts, in ascending order.
+    """
+    candidates: List[int] = []
+    # Walk backwards so a line made only of declaration characters can reuse the result of the line after it
+    next_terminator = ''
+    next_line_text = ''
+    for line_start, line_end in zip(reversed(line_starts[:-1]), reversed(line_starts[1:])):
+        line = text[line_start:line_end]
+        terminator_match = DECLARATION_TERMINATOR_PATTERN.search(line)
+        terminator = terminator_match.group() if terminator_match else next_terminator
+        line_text = line.lstrip() or next_line_text
+        if (terminator and terminator in '(=;') or line_text.startswith('struct'):
+            candidates.append(line_start)
+        next_terminator = terminator
+        next_line_text = line_text
+    candidates.reverse()
+
+    return candidates
+
+def add_doxygen_to_declarations(content: mmap.mmap) -> List[Tuple[int, bytes]]:
+    """
+    Finds the functions, variables, and structs in the content that need a Doxygen comment.
 
-def add_doxygen_to_structs(content: str) -> str:
+    :param content: The mapped content of the file.
+    :return: The positions in the content and encoded Doxygen comments to insert, in ascending order of position.
     """
-    Adds Doxygen comments to structs in the content.
+    # Match the patterns on the decoded text, so that they keep the Unicode meaning of \w and \s. Each undecodable byte
+    # becomes a single character, which the patterns do not match.
+    text = str(content, SOURCE_ENCODING, 'surrogateescape')
+    # Positions in the text are positions in the content as long as the text is ASCII
+    is_ascii = text.isascii()
+    text_position = 0
+    content_position = 0
+    # Compute the line positions once for both per-line passes, which only copy one line of the text at a time
+    line_starts: List[int] = find_line_starts(text)
+    # Write the comments with the line endings already used by the file
+    newline = b'\r\n' if text.endswith('\r\n', 0, line_starts[1]) else b'\n'
+
+    commented_line_starts = find_commented_line_starts(text, line_starts)
+    insertions: List[Tuple[int, bytes]] = []
+    # Like a separate scan per kind, a declaration cannot start inside the previous declaration of the same kind
+    search_start = dict.fromkeys(DECLARATION_KINDS, 0)
+
+    # Match each candidate as it comes, in ascending order, without keeping the matches
+    for line_start in find_declaration_candidates(text, line_starts):
+        match = DECLARATION_PATTERN.match(text, line_start)
+        if not match:
+            continue
 
-    :param content: The content of the file.
-    :return: The content with Doxygen comments added for structs.
+        for kind in DECLARATION_KINDS:
+            start, end = match.span(kind)
+            if start < search_start[kind]:
+                continue
+            search_start[kind] = end
+
+            # Skip adding comment if the declaration is already preceded by a comment
+            if start in commented_line_starts:
+                continue
+
+            if kind == 'function':
+                doxygen_comment = generate_function_comment(match['return_type'], match['function_name'], match['params'])
+            elif kind == 'variable':
+                var_type = detect_variable_type(match['declaration_type'])
+                doxygen_comment = generate_variable_comment(var_type, match['variable_name'])
+            else:
+                doxygen_comment = generate_struct_comment(match['struct_name'])
+
+            if is_ascii:
+                content_position = start
+            else:
+                # Only the text up to the declaration is encoded again, from the previous declaration onwards
+                content_position += len(text[text_position:start].encode(SOURCE_ENCODING, 'surrogateescape'))
+                text_position = start
+            insertions.append(
+                (content_position, doxygen_comment.encode(SOURCE_ENCODING, 'surrogateescape').replace(b'\n', newline))
+            )
+
+    return insertions
+
+def iter_source_files(directory: str) -> Iterator[str]:
     """
-    struct_pattern = re.compile(r'^\s*struct\s+(\w+)', re.MULTILINE)
-    struct_matches: List[re.Match] = list(struct_pattern.finditer(content))
+    Walks the directory tree and yields the paths of the source code files with a supported extension.
 
-    for match in reversed(struct_matches):
-        struct_name = match.group(1)
+    The entries come from os.scandir, whose directory listing already tells files and directories apart, so most
+    entries need no extra stat call.
 
-        # Skip adding comment if struct is already preceded by a comment
-        if is_preceded_by_comment(content, match.start()):
+    :param directory: Directory to be searched for source code files.
+    :return: An iterator over the paths of the source code files.
+    """
+    directories: List[str] = [directory]
+    while directories:
+        try:
+            entries = os.scandir(directories.pop())
+        except OSError:
+            # Skip the directories that cannot be listed, as os.walk does
             continue
 
-        doxygen_comment = generate_struct_comment(struct_name)
-        content = content[:match.start()] + doxygen_comment + content[match.start():]
-
-    return content
+        with entries:
+            for entry in entries:
+                # Like os.walk, do not descend into symbolic links to directories
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.name.endswith(SUPPORTED_EXTENSIONS) and entry.is_file():
+                    yield entry.path
 
 def process_directory(directory: str) -> None:
     """
     Processes the project directories to find and modify source code files.
 
+    Each file is independent, so the files are handed to a pool of worker processes and modified in parallel. The
+    directory walk goes on while the workers process the files found so far, and only waits for them once
+    MAX_PENDING_FILES are pending, so the memory used by the pending files stays bounded on large trees.
+
     :param directory: Directory to be processed to find the relevant files for modification.
     """  
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith(SUPPORTED_EXTENSIONS):
-                file_path = os.path.join(root, file)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        # The result of each completed file is read, during the walk and after it, to re-raise any error from its worker
+        pending: Set[Future] = set()
+        try:
+            for file_path in iter_source_files(directory):
+                if len(pending) >= MAX_PENDING_FILES:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+
                 print(f"Processing file: {file_path}")
-                add_doxygen_to_file(file_path)
+                pending.add(executor.submit(add_doxygen_to_file, file_path))
+
+            for future in as_completed(pending):
+                future.result()
+        except BaseException:
+            # Stop at the first error, like a sequential run would, instead of modifying the files still pending
+            executor.shutdown(cancel_futures=True)
+            raise
 
 if __name__ == "__main__":
     # Set the root directory as the current directory
@@ -0,0 +1,123 @@
+import errno
+import os
+import tempfile
+import unittest
+from typing import List
+from unittest import mock
+
+from doxy_tags_functions_variables import MAX_WRITE_SEGMENTS, add_doxygen_to_file
+
+
+class AddDoxygenToFileTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def process(self, source: str) -> str:
+        """
+        Writes the source code to a file, adds the Doxygen comments to it and returns the modified source code.
+        """
+        file_path = os.path.join(self.directory.name, 'source.c')
+        with open(file_path, 'w', newline='') as file:
+            file.write(source)
+        add_doxygen_to_file(file_path)
+        with open(file_path, newline='') as file:
+            return file.read()
+
+    def assertDocumented(self, output: str, names: List[str]) -> None:
+        briefs = [line for line in output.splitlines() if '@brief' in line]
+        self.assertEqual([brief.split()[-1].rstrip('.') for brief in briefs], names)
+
+    def test_one_line_block_comment_only_covers_the_next_line(self) -> None:
+        output = self.process('/* Module header */\nint a;\nint b;\nvoid f(int x);\nstruct S {\n  int y;\n};\n')
+        self.assertDocumented(output, ['b', 'f', 'S', 'y'])
+
+    def test_trailing_block_comment_only_covers_the_next_line(self) -> None:
+        output = self.process('int a; /* note */\nint b;\nint c;\n')
+        self.assertDocumented(output, ['a', 'c'])
+
+    def test_multi_line_block_comment_covers_the_next_line(self) -> None:
+        output = self.process('/*\n * Documented.\n */\nint a;\n/* Opened\n   int b;\n*/\nint c;\nint d;\n')
+        self.assertDocumented(output, ['d'])
+
+    def test_block_delimiter_in_line_comment_is_ignored(self) -> None:
+        output = self.process('// See /* here\nint a;\nint b;\n')
+        self.assertDocumented(output, ['b'])
+
+    def test_comment_delimiters_in_literals_are_ignored(self) -> None:
+        output = self.process(
+            'const char* pat = "src/*.c";\nint a;\nvoid f(int x);\nprintf("/*");\nint b;\n'
+            'char c = \'"\';\nint d;\n/* it\'s\n   int e; */\nint g;\nint h;\n'
+        )
+        self.assertDocumented(output, ['pat', 'a', 'f', 'b', 'c', 'd', 'h'])
+
+    def test_unicode_identifiers_are_documented(self) -> None:
+        output = self.process('/* Grüße */\nint a;\nint größe;\nvoid ünf(int x);\n')
+        self.assertDocumented(output, ['größe', 'ünf'])
+
+    def test_second_run_leaves_the_file_untouched(self) -> None:
+        output = self.process('/* Module header */\nint a;\nint b;\nvoid f(int x, char *y);\nstruct S {\n  int z;\n};\n')
+        file_path = os.path.join(self.directory.name, 'source.c')
+        status = os.stat(file_path)
+
+        add_doxygen_to_file(file_path)
+
+        with open(file_path, newline='') as file:
+            self.assertEqual(file.read(), output)
+        # The file is not replaced either
+        self.assertEqual(os.stat(file_path).st_ino, status.st_ino)
+
+
+@unittest.skipUnless(hasattr(os, 'writev'), 'os.writev is not available')
+class WriteSegmentsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        # Each declaration adds a comment and the slice of the source before it, so the new content has more segments
+        # than a single os.writev call writes
+        self.source = ''.join(f'int variable_{index};\n' for index in range(MAX_WRITE_SEGMENTS))
+        self.file_path = os.path.join(self.directory.name, 'source.c')
+        with open(self.file_path, 'w', newline='') as file:
+            file.write(self.source)
+
+    def read(self, file_path: str) -> str:
+        with open(file_path, newline='') as file:
+            return file.read()
+
+    def test_partial_writes_are_resumed(self) -> None:
+        expected_file_path = os.path.join(self.directory.name, 'expected.c')
+        with open(expected_file_path, 'w', newline='') as file:
+            file.write(self.source)
+        add_doxygen_to_file(expected_file_path)
+
+        batch_sizes = []
+
+        def write_a_few_bytes(file_descriptor: int, buffers: List[memoryview]) -> int:
+            """
+            Writes at most 7 bytes from the start of the buffers, possibly across several of them.
+            """
+            batch_sizes.append(len(buffers))
+            data = b''
+            for buffer in buffers:
+                data += bytes(buffer[:7 - len(data)])
+                if len(data) == 7:
+                    break
+            return os.write(file_descriptor, data)
+
+        with mock.patch('os.writev', side_effect=write_a_few_bytes):
+            add_doxygen_to_file(self.file_path)
+
+        self.assertEqual(self.read(self.file_path), self.read(expected_file_path))
+        self.assertEqual(max(batch_sizes), MAX_WRITE_SEGMENTS)
+
+    def test_failed_write_leaves_the_file_and_directory_unchanged(self) -> None:
+        with mock.patch('os.writev', side_effect=OSError(errno.ENOSPC, 'No space left on device')):
+            with self.assertRaises(OSError):
+                add_doxygen_to_file(self.file_path)
+
+        self.assertEqual(self.read(self.file_path), self.source)
+        self.assertEqual(os.listdir(self.directory.name), ['source.c'])
+
+
+if __name__ == '__main__':
+    unittest.main()